@@ -0,0 +1,78 @@
+'''
+Memory per route and registration rate for large static trees
+
+Creates a directory of empty files and adds it with add_multiple_static(),
+once with an endpoint per file and once with compact=True.
+
+    python benchmarks/static_registry.py [--counts 100000,1000000]
+'''
+import os
+import sys
+import gc
+import time
+import argparse
+import tracemalloc
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from devhttp import DevelopmentHttpServer
+
+
+EXTENSIONS = ('.html', '.js', '.css', '.png', '.json')
+FILES_PER_DIR = 1000
+
+
+def make_tree(root, count):
+    for i in range(count):
+        if i % FILES_PER_DIR == 0:
+            subdir = os.path.join(root, 'd%d' % (i // FILES_PER_DIR))
+            os.mkdir(subdir)
+        open(os.path.join(subdir, 'file%d%s' % (i, EXTENSIONS[i % len(EXTENSIONS)])), 'wb').close()
+
+
+def register(root, compact):
+    srv = DevelopmentHttpServer()
+    srv.add_multiple_static('static', root, compact=compact)
+
+    # Check a lookup works
+    assert srv.get_endpoint('static/d0/file0.html', 'GET').asset_file.size == 0
+    return srv
+
+
+def measure(root, count, compact):
+
+    # Time without tracemalloc, which slows allocation down a lot
+    gc.collect()
+    started = time.perf_counter()
+    srv = register(root, compact)
+    elapsed = time.perf_counter() - started
+    del srv
+
+    gc.collect()
+    tracemalloc.start()
+    srv = register(root, compact)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del srv
+
+    return used / count, count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--counts', default='100000,1000000',
+                        help="Comma separated numbers of files to test with")
+    args = parser.parse_args()
+
+    for count in [int(c) for c in args.counts.split(',')]:
+        with TemporaryDirectory() as root:
+            make_tree(root, count)
+            for label, compact in (('endpoints', False), ('compact', True)):
+                per_route, rate = measure(root, count, compact)
+                print("%9d files  %-10s %8.1f bytes/route %10.0f routes/sec" % (
+                    count, label, per_route, rate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+'''
+Requests/sec for small static files
+
+Serves a handful of small files from a DevelopmentHttpServer in a child
+process and hammers it from client threads, with the StaticEndpoint fast
+path and through send_response()/send_header().  Each client keeps one
+HTTP/1.1 connection open, so the time is spent responding rather than
+connecting and starting handler threads.  The two modes are run in turn
+for a number of rounds and the median of each is reported.
+
+Nagle's algorithm is disabled on the server.  Otherwise the separate header
+and body writes of send_response() stall on delayed ACKs (about 40ms per
+response), which swamps the cost being measured.
+
+    python benchmarks/static_small_files.py [--seconds 3] [--rounds 3] [--clients 4] [--size 512]
+'''
+import os
+import sys
+import time
+import socket
+import argparse
+from statistics import median
+from tempfile import TemporaryDirectory
+from threading import Thread
+from multiprocessing import Process, Queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from devhttp import DevelopmentHttpServer
+from devhttp.endpoints import StaticEndpoint
+from devhttp.DevelopmentRequestHandler import DevelopmentRequestHandler
+
+
+NUM_FILES = 16
+
+
+def run_server(root, fast_path, port_queue):
+    StaticEndpoint.FAST_PATH = fast_path
+    DevelopmentRequestHandler.protocol_version = 'HTTP/1.1'    # Keep-alive
+    DevelopmentRequestHandler.disable_nagle_algorithm = True
+
+    srv = DevelopmentHttpServer()
+    srv.configure_access_log(os.devnull)
+    srv.add_multiple_static('static', root)
+
+    listener = srv.create_listener('127.0.0.1', 0)
+    port_queue.put(listener.server_address[1])
+    listener.serve_forever()
+
+
+def read_response(sock, buffer):
+    '''Read one response from a keep-alive connection, returning what's left over'''
+    while b'\r\n\r\n' not in buffer:
+        buffer += sock.recv(65536)
+    head, buffer = buffer.split(b'\r\n\r\n', 1)
+    length = int(head.lower().split(b'content-length: ')[1].split(b'\r\n')[0])
+    while len(buffer) < length:
+        buffer += sock.recv(65536)
+    return buffer[length:]
+
+
+def client(port, deadline, counts, idx):
+    requests = [('GET /static/file%d.txt HTTP/1.1\r\nHost: bench\r\n\r\n' % (i)).encode('ascii')
+                for i in range(NUM_FILES)]
+    sock = socket.create_connection(('127.0.0.1', port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    buffer = b''
+    n = 0
+    while time.time() < deadline:
+        sock.sendall(requests[n % NUM_FILES])
+        buffer = read_response(sock, buffer)
+        n += 1
+    sock.close()
+    counts[idx] = n
+
+
+def measure(root, fast_path, seconds, clients):
+    port_queue = Queue()
+    server = Process(target=run_server, args=(root, fast_path, port_queue), daemon=True)
+    server.start()
+    port = port_queue.get()
+
+    try:
+        counts = [0] * clients
+        deadline = time.time() + seconds
+        threads = [Thread(target=client, args=(port, deadline, counts, i)) for i in range(clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        server.terminate()
+        server.join()
+
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=3, help="Length of each round")
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--size', type=int, default=512, help="Size of each file in bytes")
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as root:
+        for i in range(NUM_FILES):
+            with open(os.path.join(root, 'file%d.txt' % (i)), 'wb') as fh:
+                fh.write(b'x' * args.size)
+
+        modes = (('send_response', False), ('fast path', True))
+        rates = dict([(label, list()) for label, fast_path in modes])
+        for i in range(args.rounds):
+            for label, fast_path in modes:
+                rates[label].append(measure(root, fast_path, args.seconds, args.clients))
+
+        for label, fast_path in modes:
+            print("%-15s %10.1f requests/sec (median of %s)" % (
+                label, median(rates[label]), ', '.join(['%.0f' % r for r in rates[label]])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+import sys
+import json
+import time
+import random
+import logging
+from queue import Queue, Empty, Full
+from threading import Thread, Lock
+
+
+class AccessLog:
+    '''
+    Buffered access log written from a background thread
+
+    Handler threads only build a small tuple and put it on a bounded queue.
+    Formatting and writing is done by a single writer thread in batches so
+    that a slow disk (or terminal) doesn't hold up the request.
+    '''
+
+    COMBINED = 'combined'
+    JSON = 'json'
+
+    DROP = 'drop'
+    BLOCK = 'block'
+
+    def __init__(self, path=None, fmt=COMBINED, queue_size=10000, batch_size=256,
+                 flush_interval=0.5, on_full=DROP, sample_rate=1.0, log_static=True):
+        '''
+        :param path:
+            File to append log lines to.  If None, lines go to sys.stderr
+        :param fmt:
+            AccessLog.COMBINED (Apache combined log format) or AccessLog.JSON
+            (one JSON object per line)
+        :param queue_size:
+            Maximum number of entries waiting to be written
+        :param batch_size:
+            Maximum number of entries written with a single write() call
+        :param flush_interval:
+            Seconds the writer waits for more entries before flushing
+        :param on_full:
+            What to do when the queue is full.  AccessLog.DROP discards the entry
+            (counted in .dropped), AccessLog.BLOCK makes the handler thread wait.
+        :param sample_rate:
+            Fraction (0.0 - 1.0) of successful requests to log.  Error responses
+            (status >= 400) are always logged.
+        :param log_static:
+            If False, requests served by static endpoints are not logged at all
+        '''
+        if fmt not in (self.COMBINED, self.JSON):
+            raise ValueError("Invalid access log format: %s" % (fmt))
+        if on_full not in (self.DROP, self.BLOCK):
+            raise ValueError("Invalid queue full policy: %s" % (on_full))
+
+        self.__path = path
+        self.__fmt = fmt
+        self.__batch_size = batch_size
+        self.__flush_interval = flush_interval
+        self.__block = on_full == self.BLOCK
+        self.__sample_rate = sample_rate
+        self.__log_static = log_static
+
+        self.__queue = Queue(maxsize=queue_size)
+        self.__thread = None
+        self.__start_lock = Lock()
+        self.__closed = False
+
+        self.__dropped_lock = Lock()
+        self.dropped = 0
+
+
+    @property
+    def log_static(self):
+        return self.__log_static
+
+
+    def log(self, client_ip, requestline, status, size='-', referer=None, user_agent=None):
+        '''
+        Queue an entry to be written
+
+        size is the body size in bytes, or '-' if the response had no
+        Content-Length (null in the JSON format)
+
+        Called from the handler threads, so keep this cheap.  The timestamp is
+        captured here and formatted later by the writer thread.
+        '''
+        if self.__closed:
+            return
+
+        if self.__sample_rate < 1.0 and status < 400:
+            if random.random() >= self.__sample_rate:
+                return
+
+        if self.__thread is None:
+            self._start()
+
+        entry = (time.time(), client_ip, requestline, status, size, referer, user_agent)
+        try:
+            self.__queue.put(entry, block=self.__block)
+        except Full:
+            with self.__dropped_lock:
+                self.dropped += 1
+
+
+    def close(self):
+        '''Write any queued entries and stop the writer thread'''
+        self.__closed = True
+        with self.__start_lock:
+            if self.__thread is not None:
+                self.__queue.put(None)
+                self.__thread.join()
+                self.__thread = None
+
+
+    def _start(self):
+        with self.__start_lock:
+            if self.__thread is None:
+                self.__thread = Thread(target=self._writer, name='devhttp-access-log', daemon=True)
+                self.__thread.start()
+
+
+    def _writer(self):
+        '''Body of the background writer thread'''
+
+        if self.__path is None:
+            fh = sys.stderr
+        else:
+            fh = open(self.__path, 'at', encoding='utf-8')
+
+        format_entry = self._format_json if self.__fmt == self.JSON else self._format_combined
+
+        try:
+            stopping = False
+            while not stopping:
+
+                # Wait for at least one entry
+                try:
+                    entry = self.__queue.get(timeout=self.__flush_interval)
+                except Empty:
+                    continue
+
+                # Then take whatever else is already waiting
+                batch = list()
+                while entry is not None:
+                    batch.append(entry)
+                    if len(batch) >= self.__batch_size:
+                        break
+                    try:
+                        entry = self.__queue.get_nowait()
+                    except Empty:
+                        break
+                if entry is None:
+                    stopping = True
+
+                if batch:
+                    try:
+                        fh.write(''.join([format_entry(e) for e in batch]))
+                        fh.flush()
+                    except Exception:
+                        logging.getLogger(__name__).exception("Failed to write access log")
+        finally:
+            if fh is not sys.stderr:
+                fh.close()
+
+
+    @staticmethod
+    def _escape(value):
+        '''Escape a value for a quoted field of a combined log line'''
+        return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+    @staticmethod
+    def _format_combined(entry):
+        timestamp, client_ip, requestline, status, size, referer, user_agent = entry
+        return '%s - - [%s] "%s" %s %s "%s" "%s"\n' % (
+            client_ip,
+            time.strftime('%d/%b/%Y:%H:%M:%S %z', time.localtime(timestamp)),
+            AccessLog._escape(requestline),
+            status,
+            size,
+            AccessLog._escape(referer or '-'),
+            AccessLog._escape(user_agent or '-'))
+
+
+    @staticmethod
+    def _format_json(entry):
+        timestamp, client_ip, requestline, status, size, referer, user_agent = entry
+        return json.dumps({
+            'time':         time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(timestamp)),
+            'client':       client_ip,
+            'request':      requestline,
+            'status':       status,
+            'size':         None if size == '-' else size,
+            'referer':      referer,
+            'user_agent':   user_agent,
+        }) + "\n"
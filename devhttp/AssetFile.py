@@ -8,6 +8,8 @@ from zipfile import ZipFile
 class AssetFile:
     '''A single static file that the server can serve'''
 
+    __slots__ = ('__type', '__name', '__content_type', '__path', '__size')
+
     STATIC_FILE = 'static'
     ASSET = 'asset'
 
@@ -97,7 +99,9 @@ class SavedAssetFile(AssetFile):
     Contents will be read back from in-memory zip file
     '''
 
-    def __init__(self, zf, zf_name, metadata):
+    __slots__ = ('__zf', '__zf_name', '__template_zf_name', '__template_code')
+
+    def __init__(self, zf, zf_name, metadata, template_zf_name=None):
         '''
         :param zf:
             ZipFile to read content from (wrapped with a thread-safe reader)
@@ -107,6 +111,9 @@ class SavedAssetFile(AssetFile):
             using the same BytesIO
         :param metadata:
             Metadata saved by AssetFile.save_metadata()
+        :param template_zf_name:
+            Name of the item in the ZipFile holding the precompiled Jinja
+            template for this asset (if any)
         '''
         super().__init__(
             name = metadata['name'],
@@ -117,6 +124,8 @@ class SavedAssetFile(AssetFile):
 
         self.__zf = zf
         self.__zf_name = zf_name
+        self.__template_zf_name = template_zf_name
+        self.__template_code = None
 
 
     def _load_file_attributes(self):
@@ -127,3 +136,58 @@ class SavedAssetFile(AssetFile):
     def content(self):
         return self.__zf.read(self.__zf_name)
 
+    @property
+    def template_code(self):
+        '''Code object of the precompiled template (compiled to bytecode on first use)'''
+        if self.__template_zf_name is None:
+            return None
+        if self.__template_code is None:
+            source = self.__zf.read(self.__template_zf_name).decode('utf-8')
+            self.__template_code = compile(source, self.name, 'exec')
+        return self.__template_code
+
+
+
+class RenderedAssetFile(AssetFile):
+    '''
+    Asset file whose content was generated in memory
+
+    Used for the output of dynamic endpoints frozen by DevelopmentHttpServer.freeze()
+    '''
+
+    __slots__ = ('__content', )
+
+    def __init__(self, name, content_type, content):
+        '''
+        :param name: URL of the endpoint that generated the content
+        :param content_type: The content type to provide
+        :param content: bytes generated
+        '''
+        self.__content = content
+        super().__init__(
+            asset_type = AssetFile.STATIC_FILE,
+            name = name,
+            content_type = content_type,
+            path = None,
+            size = len(content))
+
+
+    def _load_file_attributes(self):
+        pass
+
+    @property
+    def content(self):
+        return self.__content
+
+
+class ScannedAssetFile(AssetFile):
+    '''
+    Asset file whose attributes were already read when its directory was scanned
+
+    Created on lookup by CompactStaticTable, so skips checking the disk again
+    '''
+
+    __slots__ = ()
+
+    def _load_file_attributes(self):
+        pass
@@ -0,0 +1,105 @@
+import os
+from array import array
+from functools import lru_cache
+from mimetypes import guess_type
+
+from .AssetFile import AssetFile, ScannedAssetFile
+from .endpoints import StaticEndpoint
+
+
+class CompactStaticTable:
+    '''
+    Static files under a single directory, stored as columns instead of objects
+
+    Each file costs one dict entry (keyed by its path relative to the directory,
+    which is also used to build the path on disk), a size and a content type
+    index.  Content types are interned in a shared list.  The AssetFile and
+    StaticEndpoint for a file are only created when it's requested, and the most
+    recently requested ones are kept.
+    '''
+
+    def __init__(self, url_prefix, root, cache_size=1024):
+        '''
+        :param url_prefix: Normalized URL prefix (ending in '/' unless empty)
+        :param root: Directory the files are under
+        :param cache_size: Number of endpoints to keep after creating them
+        '''
+        self.__prefix = url_prefix
+        self.__root = root
+
+        # Columns
+        self.__rows = dict()            # [relative path]: row
+        self.__sizes = array('q')
+        self.__content_types = array('H')
+
+        # Interned content types and the extension lookups that found them
+        self.__types = [None]
+        self.__type_ids = {None: 0}
+        self.__ext_type_ids = dict()
+
+        self._endpoint = lru_cache(maxsize=cache_size)(self.__make_endpoint)
+
+
+    def add(self, relpath, size):
+        '''
+        Add a file
+
+        :param relpath: Path relative to the root, using '/' as separator
+        :param size: Size of the file in bytes
+        '''
+        ext = os.path.splitext(relpath)[1].lower()
+        type_id = self.__ext_type_ids.get(ext)
+        if type_id is None:
+            content_type = guess_type('file' + ext)[0]
+            type_id = self.__type_ids.get(content_type)
+            if type_id is None:
+                type_id = len(self.__types)
+                self.__types.append(content_type)
+                self.__type_ids[content_type] = type_id
+            self.__ext_type_ids[ext] = type_id
+
+        row = self.__rows.get(relpath)
+        if row is None:
+            self.__rows[relpath] = len(self.__sizes)
+            self.__sizes.append(size)
+            self.__content_types.append(type_id)
+        else:
+            self.__sizes[row] = size
+            self.__content_types[row] = type_id
+            self._endpoint.cache_clear()
+
+
+    def get(self, url):
+        '''
+        The StaticEndpoint for a normalized URL, or None if not in this table
+        '''
+        if not url.startswith(self.__prefix):
+            return None
+        relpath = url[len(self.__prefix):]
+        if relpath not in self.__rows:
+            return None
+        return self._endpoint(relpath)
+
+
+    def __make_endpoint(self, relpath):
+        row = self.__rows[relpath]
+        file = ScannedAssetFile(
+            asset_type = AssetFile.ASSET,
+            name = self.__prefix + relpath,
+            content_type = self.__types[self.__content_types[row]],
+            path = os.path.join(self.__root, relpath),
+            size = self.__sizes[row])
+        return StaticEndpoint(asset = file)
+
+
+    def __contains__(self, url):
+        return url.startswith(self.__prefix) and url[len(self.__prefix):] in self.__rows
+
+    def __len__(self):
+        return len(self.__rows)
+
+
+    def items(self):
+        '''Yield (url, StaticEndpoint) for every file (creating the endpoints)'''
+        for relpath in list(self.__rows.keys()):
+            yield self.__prefix + relpath, self.__make_endpoint(relpath)
@@ -0,0 +1,99 @@
+from threading import Lock
+
+
+class ConnectionLimits:
+    '''
+    Admission control and socket timeout settings for the server
+
+    Also keeps count of requests shed because of overload and of connections
+    dropped because a client was too slow.
+    '''
+
+    # Settings that can be changed with DevelopmentHttpServer.configure_limits()
+    OPTIONS = ('max_connections', 'header_timeout', 'body_timeout', 'write_timeout', 'retry_after')
+
+    def __init__(self, max_connections=None, header_timeout=None, body_timeout=None,
+                 write_timeout=None, retry_after=1):
+        '''
+        :param max_connections:
+            Maximum number of connections handled at once.  Connections over the
+            limit are immediately answered with 503 and closed.  None for no limit.
+        :param header_timeout:
+            Seconds the client has to send the request line and all headers
+        :param body_timeout:
+            Seconds the client has to send the whole request body (counted
+            from the end of the headers)
+        :param write_timeout:
+            Seconds to wait on each write of the response to a slow reader
+        :param retry_after:
+            Seconds to send in the Retry-After header of 503 responses
+        '''
+        self.max_connections = max_connections
+        self.header_timeout = header_timeout
+        self.body_timeout = body_timeout
+        self.write_timeout = write_timeout
+        self.retry_after = retry_after
+
+        self.__lock = Lock()
+        self.__active = 0
+        self.__shed = 0
+        self.__timeouts = 0
+
+
+    def acquire_connection(self):
+        '''Count a new connection, or return False if it should be shed'''
+        with self.__lock:
+            if self.max_connections is not None and self.__active >= self.max_connections:
+                self.__shed += 1
+                return False
+            self.__active += 1
+            return True
+
+
+    def release_connection(self):
+        with self.__lock:
+            self.__active -= 1
+
+
+    def record_shed(self):
+        with self.__lock:
+            self.__shed += 1
+
+
+    def record_timeout(self):
+        with self.__lock:
+            self.__timeouts += 1
+
+
+    @property
+    def overload_response(self):
+        '''Raw 503 response to write to a connection being shed'''
+        return (
+            "HTTP/1.0 503 Service Unavailable\r\n"
+            "Retry-After: %d\r\n"
+            "Content-Length: 0\r\n"
+            "Connection: close\r\n"
+            "\r\n" % (self.retry_after)).encode('latin-1')
+
+
+    @property
+    def active_connections(self):
+        return self.__active
+
+    @property
+    def shed_count(self):
+        return self.__shed
+
+    @property
+    def timeout_count(self):
+        return self.__timeouts
+
+
+    def stats(self):
+        '''Snapshot of the counters'''
+        with self.__lock:
+            return {
+                'active_connections':   self.__active,
+                'shed':                 self.__shed,
+                'timeouts':             self.__timeouts,
+            }
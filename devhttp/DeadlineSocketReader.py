@@ -0,0 +1,55 @@
+import io
+import time
+import socket
+
+
+class DeadlineSocketReader(io.RawIOBase):
+    '''
+    Raw reader for a request handler's rfile that enforces a deadline
+
+    A per-recv socket timeout lets a client that trickles in a byte at a time
+    hold the connection forever.  Before every recv the socket timeout is set
+    to the time left until the deadline, so the whole read phase is limited.
+
+    All socket timeouts for the connection go through set_socket_timeout() so
+    the current value is known and only changed when needed.
+    '''
+
+    def __init__(self, sock):
+        self.__sock = sock
+        self.__timeout = sock.gettimeout()
+        self.__deadline = None
+
+
+    def readable(self):
+        return True
+
+
+    def set_deadline(self, seconds):
+        '''
+        Limit the time for all reads from now on
+
+        :param seconds: Seconds from now, or None for no limit
+        '''
+        if seconds is None:
+            self.__deadline = None
+        else:
+            self.__deadline = time.monotonic() + seconds
+
+
+    def set_socket_timeout(self, timeout):
+        '''Change the socket timeout (skipped when it's already set)'''
+        if timeout != self.__timeout:
+            self.__sock.settimeout(timeout)
+            self.__timeout = timeout
+
+
+    def readinto(self, b):
+        if self.__deadline is None:
+            self.set_socket_timeout(None)
+        else:
+            remaining = self.__deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout("timed out")
+            self.set_socket_timeout(remaining)
+        return self.__sock.recv_into(b)
@@ -1,6 +1,6 @@
 import os
 import logging
-from threading import RLock
+from threading import Lock, RLock, Thread, Event
 from http.server import HTTPServer
 from socketserver import ThreadingMixIn
 from mimetypes import guess_type
@@ -9,21 +9,99 @@ from tempfile import TemporaryFile
 from zipfile import ZipFile, ZIP_DEFLATED
 from base64 import b64encode
 from io import BytesIO
+from hashlib import sha1
+from itertools import chain
 import json
 
-from .AssetFile import AssetFile, SavedAssetFile
+import jinja2
+
+from .AssetFile import AssetFile, SavedAssetFile, RenderedAssetFile, ScannedAssetFile
+from .FrozenRequest import FrozenRequest
+from .AccessLog import AccessLog
+from .EventBroadcaster import EventBroadcaster
+from .CompactStaticTable import CompactStaticTable
+from .ConnectionLimits import ConnectionLimits
 from .DevelopmentRequestHandler import DevelopmentRequestHandler
+from .UpstreamConnectionPool import UpstreamConnectionPool
+from .ServerAssetsAccess import ServerAssetsAccess
+from .template_helpers import compile_template
 
-from .endpoints import StaticEndpoint, DynamicEndpoint, NotFoundEndpoint
+from .endpoints import StaticEndpoint, DynamicEndpoint, NotFoundEndpoint, ProxyEndpoint
+from .endpoints import EventStreamEndpoint
 
-from .utils import find, normalize_url, SharedZipFileReader
+from .utils import find, scan, normalize_url, normalize_query, fingerprint_url, SharedZipFileReader
 
 class ThreadedHTTPListener(ThreadingMixIn, HTTPServer):
     """Handle requests in a separate thread."""
 
+    # Listen backlog (HTTPServer default is 5, too few for many browser tabs
+    # reconnecting to event streams at once)
+    request_queue_size = 128
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Connections handed off by their handler, which mustn't be closed here
+        self.__detached = set()
+        self.__detached_lock = Lock()
+
+
+    def detach_request(self, request):
+        '''Leave a connection open when its handler returns'''
+        with self.__detached_lock:
+            self.__detached.add(request)
+
+
+    def shutdown_request(self, request):
+        with self.__detached_lock:
+            if request in self.__detached:
+                self.__detached.discard(request)
+                return
+        super().shutdown_request(request)
+
+
+    def process_request(self, request, client_address):
+        limits = self.development_http_server.limits
+
+        # Over the connection limit: answer 503 from this thread and move on
+        if not limits.acquire_connection():
+            self.shed_request(request, limits)
+            return
+
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            limits.release_connection()
+            raise
+
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.development_http_server.limits.release_connection()
+
+
+    def shed_request(self, request, limits):
+        '''Send a 503 without waiting on the client, and close the connection'''
+        try:
+            request.setblocking(False)
+            request.send(limits.overload_response)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
 class DevelopmentHttpServer:
     '''A quick and dirty HTTP server'''
 
+    # Cache-Control for fingerprinted URLs (content can never change) and for
+    # the plain URL of a fingerprinted file (which changes when the file does)
+    IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+    ALIAS_CACHE_CONTROL = 'public, max-age=60'
+
+    # Number of hex digits of the content hash to put in fingerprinted URLs
+    FINGERPRINT_LENGTH = 10
+
     def __init__(self):
 
         # Store static and dynamic endpoints in one collection
@@ -35,16 +113,42 @@ class DevelopmentHttpServer:
         # Redirects or URL aliases  [url]: redirect_to_url
         self.__redirects = dict()
 
+        # Content-hashed aliases of static files  [url]: fingerprinted_url
+        self.__fingerprints = dict()
+
+        # Static directories added with add_multiple_static(compact=True)
+        self.__tables = list()
+
+        # Reverse proxied URL prefixes  [(prefix, ProxyEndpoint)], longest prefix first
+        self.__proxies = list()
+
+        # Pre-rendered dynamic endpoints  [url][normalized query]: StaticEndpoint
+        self.__frozen = dict()
+        self.__refreshers = list()  # Stop Event for each refresh thread
+
+        # What dynamic content generators get as their assets parameter
+        self.__assets_access = ServerAssetsAccess(self.__assets, self.url_for)
+
         # Lock to protect concurrent access across handler threads
         self.lock = RLock()
 
+        # Optional buffered access log (None logs to stderr as BaseHTTPRequestHandler does)
+        self.access_log = None
+
+        # Connection limits, timeouts and overload counters
+        self.limits = ConnectionLimits()
 
-    def get_endpoint(self, url_path, method):
+        # Sends events to connections of endpoints added with add_event_stream()
+        self.events = EventBroadcaster()
+
+
+    def get_endpoint(self, url_path, method, query=None):
         '''
         Called by handler to get the response contents
 
         :param url: Path portion of URL
         :param method: GET, POST, etc.
+        :param query: Query string portion of URL
         '''
 
         url_path = normalize_url(url_path)
@@ -53,13 +157,34 @@ class DevelopmentHttpServer:
             if url_path in self.__redirects:
                 url_path = self.__redirects[url_path]
 
+            # Variants that were frozen ahead of time, else run the view
+            frozen = self.__frozen.get(url_path)
+            if frozen is not None:
+                endpoint = frozen.get(normalize_query(query) if query else '')
+                if endpoint is not None:
+                    return endpoint
+
             if url_path in self.__endpoints:
                 return self.__endpoints[url_path]
 
+            # Frozen without the view (loaded from an assets module), and this
+            # variant wasn't frozen
+            if frozen is not None:
+                return NotFoundEndpoint()
+
+            for table in self.__tables:
+                endpoint = table.get(url_path)
+                if endpoint is not None:
+                    return endpoint
+
+            for prefix, endpoint in self.__proxies:
+                if prefix == '' or url_path == prefix or url_path.startswith(prefix + '/'):
+                    return endpoint
+
         return NotFoundEndpoint()
 
 
-    def add_static(self, url, path, content_type=None, size=None):
+    def add_static(self, url, path, content_type=None, size=None, fingerprint=False):
         '''
         Add a static file that can be served by the server
 
@@ -74,6 +199,10 @@ class DevelopmentHttpServer:
             Content type to provide with the content
         :param size:
             Size of the content in bytes
+        :param fingerprint:
+            If True, also serve the file under a URL containing a hash of its
+            content (see url_for()) with a long lived Cache-Control.  The plain
+            URL is then only cached for a short time.
         '''
         url = normalize_url(url)
 
@@ -90,10 +219,38 @@ class DevelopmentHttpServer:
                 content_type = content_type,
                 path = path,
                 size = size)
-            self.__endpoints[url] = StaticEndpoint(asset = file)
+
+            if fingerprint:
+                self.__add_fingerprinted(url, file)
+            else:
+                self.__endpoints[url] = StaticEndpoint(asset = file)
 
 
-    def add_multiple_static(self, url_prefix, path, filter_paths=None):
+    def __add_fingerprinted(self, url, file):
+        '''
+        Register a static file under both its plain and fingerprinted URLs
+
+        The fingerprinted URL serves a copy of the content that was hashed, so
+        editing the file can't change what's cached under it.  The plain URL
+        keeps reading the file from disk.
+        '''
+        content = file.content
+        digest = sha1(content).hexdigest()[:self.FINGERPRINT_LENGTH]
+        fingerprinted_url = fingerprint_url(url, digest)
+
+        self.__endpoints[url] = StaticEndpoint(
+            asset = file,
+            cache_control = self.ALIAS_CACHE_CONTROL)
+        self.__endpoints[fingerprinted_url] = StaticEndpoint(
+            asset = RenderedAssetFile(
+                name = fingerprinted_url,
+                content_type = file.content_type,
+                content = content),
+            cache_control = self.IMMUTABLE_CACHE_CONTROL)
+        self.__fingerprints[url] = fingerprinted_url
+
+
+    def add_multiple_static(self, url_prefix, path, filter_paths=None, fingerprint=False, compact=False):
         '''
         Add multiple static files that can be served
 
@@ -103,17 +260,37 @@ class DevelopmentHttpServer:
             Path to directory to `search for files under
         :param filter_paths:
             method to filter which paths to include
+        :param fingerprint:
+            Fingerprint each file (see add_static())
+        :param compact:
+            Store the files in a CompactStaticTable rather than an endpoint per
+            file.  Uses much less memory and is quicker to add for large trees.
+            Files added this way are found after other endpoints with the same URL.
         '''
 
         url_prefix = normalize_url(url_prefix)
         if url_prefix != '' and not url_prefix.endswith('/'):
             url_prefix += '/'
 
+        if compact:
+            if fingerprint:
+                raise ValueError("Fingerprinting isn't supported for compact statics")
+
+            table = CompactStaticTable(url_prefix, path)
+            for filepath, size in scan(path):
+                if filter_paths is None or filter_paths(filepath):
+                    table.add(filepath, size)
+
+            with self.lock:
+                self.__tables.append(table)
+            return
+
         for filepath in find(path):
             if filter_paths is None or filter_paths(filepath):
                 self.add_static(
                     url = url_prefix + filepath,
-                    path = os.path.join(path, filepath))
+                    path = os.path.join(path, filepath),
+                    fingerprint = fingerprint)
 
 
     def add_asset(self, name, path):
@@ -141,7 +318,7 @@ class DevelopmentHttpServer:
                 size = None)
 
 
-    def add_dynamic(self, url, callable, content_type=None, autolock=True):
+    def add_dynamic(self, url, callable, content_type=None, autolock=True, max_concurrency=None):
         '''
         Add a dynamic content generating method callable
 
@@ -167,6 +344,9 @@ class DevelopmentHttpServer:
             manually on a long-running request, set to false and lock in your view with:
                 with server.lock:
                     # do stuff
+        :param max_concurrency:
+            Maximum number of requests to this view to run at once.  Requests over
+            the limit are answered with 503 and a Retry-After header.
         '''
 
         url = normalize_url(url)
@@ -191,6 +371,7 @@ class DevelopmentHttpServer:
                 if content_type[0] is None:
                     logging.getLogger(__name__).warning(
                         "Can't determine mimetype for %s" % (filename))
+                    content_type = None
                 else:
                     content_type = content_type[0]
 
@@ -198,9 +379,171 @@ class DevelopmentHttpServer:
             self.__endpoints[url] = DynamicEndpoint(
                 callable = callable,
                 server = self,
-                assets = self.__assets,
+                assets = self.__assets_access,
                 content_type = content_type,
-                autolock = autolock)
+                autolock = autolock,
+                max_concurrency = max_concurrency)
+
+
+    def freeze(self, url, queries=None, refresh_interval=None):
+        '''
+        Render a dynamic endpoint now and serve the result as a static file
+
+        The view is called once for each query string variant.  Requests for those
+        variants are then served without calling the view (or taking server.lock).
+        Other query strings still go to the view (or 404 if only the frozen content
+        was loaded by load_assets_module()).  Frozen content is included by
+        save_assets_module().
+
+        Typical usage:
+            .freeze('index.html')
+            .freeze('list.html', queries=['', 'page=2', {'page': 3}])
+
+        :param url:
+            URL of an endpoint added with add_dynamic()
+        :param queries:
+            Query strings (or dicts of parameters) to render.  Default is just
+            the URL without a query string.
+        :param refresh_interval:
+            If given, render the variants again every refresh_interval seconds in
+            a background thread, swapping in the new content once all are rendered
+        '''
+
+        url = normalize_url(url)
+        if queries is None:
+            queries = ['']
+        queries = [normalize_query(q) for q in queries]
+
+        with self.lock:
+            endpoint = self.__endpoints.get(url)
+            if not isinstance(endpoint, DynamicEndpoint):
+                raise KeyError("No dynamic endpoint defined for url %s" % (url))
+
+        self.__render_frozen(url, endpoint, queries)
+
+        if refresh_interval is not None:
+            stop = Event()
+            with self.lock:
+                self.__refreshers.append(stop)
+            Thread(
+                target = self.__refresh_frozen,
+                args = (url, endpoint, queries, refresh_interval, stop),
+                name = 'devhttp-freeze-%s' % (url),
+                daemon = True).start()
+
+
+    def __render_frozen(self, url, endpoint, queries):
+        '''Render query variants of a view and swap them in together'''
+
+        rendered = dict()
+        for query in queries:
+            content = endpoint.generate(FrozenRequest(url, query))
+            file = RenderedAssetFile(
+                name = url,
+                content_type = endpoint.content_type,
+                content = content)
+            rendered[query] = StaticEndpoint(asset = file)
+
+        with self.lock:
+            variants = dict(self.__frozen.get(url, dict()))
+            variants.update(rendered)
+            self.__frozen[url] = variants
+
+
+    def __refresh_frozen(self, url, endpoint, queries, interval, stop):
+        while not stop.wait(interval):
+            try:
+                self.__render_frozen(url, endpoint, queries)
+            except Exception:
+                logging.getLogger(__name__).exception(
+                    "Failed to refresh frozen endpoint %s" % (url))
+
+
+    def stop_refreshing(self):
+        '''Stop the background threads started by freeze(refresh_interval=...)'''
+        with self.lock:
+            refreshers = self.__refreshers
+            self.__refreshers = list()
+        for stop in refreshers:
+            stop.set()
+
+
+    def add_proxy(self, prefix, upstream_url, timeout=30, retries=1, max_idle=8):
+        '''
+        Forward all requests under a URL prefix to another HTTP server
+
+        Typical usage:
+            .add_proxy('api', 'http://127.0.0.1:9000/v1')
+
+        Would forward /api/users?id=3 to http://127.0.0.1:9000/v1/users?id=3.
+        Request and response bodies are streamed rather than buffered, and
+        connections to the upstream are kept alive and reused.
+
+        :param prefix:
+            URL prefix to forward (exact endpoints still take priority)
+        :param upstream_url:
+            Base URL of the upstream server
+        :param timeout:
+            Seconds to wait on connecting to and reading from the upstream
+        :param retries:
+            Times to retry an idempotent request without a body if the
+            upstream fails before responding
+        :param max_idle:
+            Maximum number of idle keep-alive connections to the upstream
+        '''
+
+        prefix = normalize_url(prefix)
+
+        with self.lock:
+
+            if prefix in [p for p, e in self.__proxies]:
+                raise KeyError("Proxy already defined for prefix %s" % (prefix))
+
+            pool = UpstreamConnectionPool(upstream_url, max_idle=max_idle, timeout=timeout)
+            self.__proxies.append((prefix, ProxyEndpoint(prefix, pool, retries=retries)))
+            self.__proxies.sort(key=lambda p: len(p[0]), reverse=True)
+
+
+    def add_event_stream(self, url, channel=None):
+        '''
+        Add a Server-Sent Events (text/event-stream) endpoint
+
+        Connections are handed to a single broadcaster thread once the headers
+        have been sent, rather than each keeping a handler thread.  Send events
+        with publish().
+
+        :param url:
+            The URL that represents the stream to the browser
+        :param channel:
+            Name of the channel to send events from.  Defaults to the (normalized) url.
+        '''
+
+        url = normalize_url(url)
+        if channel is None:
+            channel = url
+
+        with self.lock:
+
+            # Make sure path is unique
+            if url in self.__endpoints:
+                raise KeyError("Path already defined for a view")
+
+            self.__endpoints[url] = EventStreamEndpoint(self.events, channel)
+
+
+    def publish(self, channel, data, event=None, id=None):
+        '''
+        Send an event to every client connected to a channel's event streams
+
+        Safe to call from any thread, and doesn't wait for clients to receive it.
+        Clients too slow to keep up are disconnected (see server.events).
+
+        :param channel: Channel name given to add_event_stream()
+        :param data: Event data (str, or anything else to send as JSON)
+        :param event: Optional event type
+        :param id: Optional event id
+        '''
+        self.events.publish(channel, data, event=event, id=id)
 
 
     def redirect(self, from_url, to_url):
@@ -227,14 +570,90 @@ class DevelopmentHttpServer:
             self.__redirects[from_url] = to_url
 
 
-    def serve_forever(self, ip, port):
-        '''Listted for HTTP requests as serve content from this server'''
+    def url_for(self, url):
+        '''
+        URL the browser should use to request a static file or view
+
+        Returns the fingerprinted URL for files added with fingerprint=True,
+        otherwise the URL itself.  Also available to templates rendered with
+        render_jinja() as url_for().
+
+        :param url: URL the endpoint was added with
+        '''
+        url = normalize_url(url)
+
+        with self.lock:
+            if url in self.__fingerprints:
+                return '/' + self.__fingerprints[url]
+            if url in self.__endpoints or url in self.__redirects or url in self.__frozen:
+                return '/' + url
+            if any([url in table for table in self.__tables]):
+                return '/' + url
+
+        raise KeyError("No endpoint defined for url %s" % (url))
+
+
+    def configure_limits(self, **options):
+        '''
+        Set connection limits and timeouts
+
+        See ConnectionLimits for the options (max_connections, header_timeout,
+        body_timeout, write_timeout, retry_after).  Shed and timeout counts are
+        available from server.limits.stats().
+        '''
+        with self.lock:
+            for name, value in options.items():
+                if name not in ConnectionLimits.OPTIONS:
+                    raise KeyError("Unknown limit: %s" % (name))
+                setattr(self.limits, name, value)
+        return self.limits
+
+
+    def configure_access_log(self, path=None, fmt=AccessLog.COMBINED, **options):
+        '''
+        Log requests through a buffered AccessLog written by a background thread
+
+        :param path:
+            File to append to (None for stderr)
+        :param fmt:
+            AccessLog.COMBINED or AccessLog.JSON
+        :param options:
+            Other AccessLog options (queue_size, batch_size, on_full,
+            sample_rate, log_static, ...)
+        '''
+        access_log = AccessLog(path=path, fmt=fmt, **options)
+        with self.lock:
+            old_log = self.access_log
+            self.access_log = access_log
+        if old_log is not None:
+            old_log.close()
+        return access_log
+
+
+    def create_listener(self, ip, port):
+        '''
+        Create the listening socket server for this server without serving yet
+
+        Useful to bind port 0 and read back .server_address, or to run
+        .serve_forever() on a thread of your own.
+        '''
         http_server = ThreadedHTTPListener((ip, port), DevelopmentRequestHandler)
         http_server.development_http_server = self
-        http_server.serve_forever()
+        return http_server
 
 
-    def save_assets_module(self, path, var_name='STATIC_DATA'):
+    def serve_forever(self, ip, port):
+        '''Listted for HTTP requests as serve content from this server'''
+        http_server = self.create_listener(ip, port)
+        try:
+            http_server.serve_forever()
+        finally:
+            self.events.close()
+            if self.access_log is not None:
+                self.access_log.close()
+
+
+    def save_assets_module(self, path, var_name='STATIC_DATA', precompile_templates=False):
         '''
         Create a Python module that contains all statics and assets
 
@@ -242,37 +661,61 @@ class DevelopmentHttpServer:
 
         :param path: Path to module to write
         :param var_name: Name of variable holding the data in the module
+        :param precompile_templates:
+            Also store assets compiled as Jinja templates, so render_jinja()
+            doesn't need to parse them after loading.  True to try every asset
+            (skipping any that aren't valid templates), or a callable taking
+            the asset name and returning True for the templates to compile.
         '''
 
         # Begin manifest
         manifest = {
             'endpoints': list(),
             'assets': list(),
+            'fingerprints': dict(self.__fingerprints),
+            'jinja_version': jinja2.__version__,
         }
 
         # Zip up the files
         zip_fh = TemporaryFile(suffix='.zip')
         with ZipFile(zip_fh, mode='w') as zip:
 
-            # Statics
+            # Statics (and frozen dynamic endpoints)
+            statics = [(url, None, endpoint) for url, endpoint in self.__endpoints.items()]
+            for url, variants in self.__frozen.items():
+                statics.extend([(url, query, endpoint) for query, endpoint in variants.items()])
+
+            # Compact tables create their endpoints as they're iterated, so
+            # aren't put in a list (and never share files with other URLs)
+            tables = ((url, None, endpoint)
+                      for table in self.__tables for url, endpoint in table.items())
+
             i = 0
-            for url, endpoint in self.__endpoints.items():
+            saved = dict()  # Files served under more than one URL are only stored once
+            for url, query, endpoint in chain(statics, tables):
 
                 try:
                     asset = endpoint.asset_file
                 except AttributeError:
                     continue
 
-                i += 1
-                filename = 'static.%d.dat' % (i)
+                filename = saved.get(id(asset))
+                if filename is None:
+                    i += 1
+                    filename = 'static.%d.dat' % (i)
+                    if not isinstance(asset, ScannedAssetFile):
+                        saved[id(asset)] = filename
+                    zip.writestr(filename, asset.content, ZIP_DEFLATED)
 
-                manifest['endpoints'].append({
+                info = {
                     'url':      url,
                     'asset':    asset.save_metadata(),
                     'filename': filename,
-                })
-
-                zip.writestr(filename, asset.content, ZIP_DEFLATED)
+                    'cache_control': endpoint.cache_control,
+                }
+                if query is not None:
+                    info['query'] = query
+                manifest['endpoints'].append(info)
 
 
             # Assets
@@ -281,14 +724,28 @@ class DevelopmentHttpServer:
 
                 i += 1
                 filename = 'asset.%d.dat' % (i)
+                content = asset.content
 
-                manifest['assets'].append({
+                info = {
                     'name':     name,
                     'asset':    asset.save_metadata(),
                     'filename': filename,
-                })
+                }
 
-                zip.writestr(filename, asset.content, ZIP_DEFLATED)
+                zip.writestr(filename, content, ZIP_DEFLATED)
+
+                # Precompiled template
+                if precompile_templates is True or (
+                        callable(precompile_templates) and precompile_templates(name)):
+                    try:
+                        template = compile_template(name, content.decode('utf-8'))
+                    except UnicodeDecodeError:
+                        template = None
+                    if template is not None:
+                        info['template'] = 'template.%d.py' % (i)
+                        zip.writestr(info['template'], template, ZIP_DEFLATED)
+
+                manifest['assets'].append(info)
 
             # Save manifest file
             zip.writestr('manifest.json', json.dumps(manifest, indent=4), ZIP_DEFLATED)
@@ -333,15 +790,35 @@ class DevelopmentHttpServer:
             raise Exception("Failed to read asset data: %s" % (str(e)))
 
         # Restore endpoints
+        files = dict()
         for info in manifest['endpoints']:
             # see add_static()
             # TODO: Make common method for add_static() and load_assets_module to call
             url = info['url']
-            file = SavedAssetFile(
-                zf = zf,
-                zf_name = info['filename'],
-                metadata = info['asset'])
-            self.__endpoints[url] = StaticEndpoint(asset = file)
+            file = files.get(info['filename'])
+            if file is None:
+                file = SavedAssetFile(
+                    zf = zf,
+                    zf_name = info['filename'],
+                    metadata = info['asset'])
+                files[info['filename']] = file
+            endpoint = StaticEndpoint(
+                asset = file,
+                cache_control = info.get('cache_control'))
+            if 'query' in info:
+                self.__frozen.setdefault(url, dict())[info['query']] = endpoint
+            else:
+                self.__endpoints[url] = endpoint
+
+        # Restore fingerprinted URLs
+        self.__fingerprints.update(manifest.get('fingerprints', dict()))
+
+        # Precompiled templates are only good for the Jinja version that made them
+        use_templates = manifest.get('jinja_version') == jinja2.__version__
+        if not use_templates and any(['template' in info for info in manifest['assets']]):
+            logging.getLogger(__name__).info(
+                "Ignoring precompiled templates from Jinja %s (running %s)" % (
+                    manifest.get('jinja_version'), jinja2.__version__))
 
         # Restore assets
         for info in manifest['assets']:
@@ -351,7 +828,8 @@ class DevelopmentHttpServer:
             file = SavedAssetFile(
                 zf = zf,
                 zf_name = info['filename'],
-                metadata=info['asset'])
+                metadata=info['asset'],
+                template_zf_name = info.get('template') if use_templates else None)
             self.__assets[name] = file
 
 
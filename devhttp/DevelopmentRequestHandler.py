@@ -1,11 +1,15 @@
+import io
 import sys
+import socket
 from http.server import HTTPServer, BaseHTTPRequestHandler
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse
 from mimetypes import guess_type
 from textwrap import dedent
 import traceback
 
-from .endpoints import InternalError
+from .endpoints import InternalError, StaticEndpoint
+from .DeadlineSocketReader import DeadlineSocketReader
+from .utils import query_parameter
 
 class DevelopmentRequestHandler(BaseHTTPRequestHandler):
     '''
@@ -52,7 +56,90 @@ class DevelopmentRequestHandler(BaseHTTPRequestHandler):
     def devhttpsrv(self):
         return self.server.development_http_server
 
+    endpoint = None
+
+    def setup(self):
+        super().setup()
+        self.__access_entry = None
+
+        # Read through a DeadlineSocketReader so header and body timeouts
+        # limit the whole read, not each recv()
+        self.rfile.close()
+        self.__reader = DeadlineSocketReader(self.connection)
+        self.rfile = io.BufferedReader(self.__reader, io.DEFAULT_BUFFER_SIZE)
+
+
+    def handle_one_request(self):
+        limits = self.devhttpsrv.limits
+        self.__reader.set_deadline(limits.header_timeout)
+
+        # BaseHTTPRequestHandler catches a timeout reading the request line, logs
+        # it and closes the connection.  raw_requestline is only left unset then.
+        self.raw_requestline = None
+        try:
+            super().handle_one_request()
+        finally:
+            self._write_access_entry()
+        if self.raw_requestline is None:
+            limits.record_timeout()
+
+
+    def parse_request(self):
+        limits = self.devhttpsrv.limits
+        try:
+            parsed = super().parse_request()
+        except socket.timeout:
+            limits.record_timeout()
+            raise
+        if parsed:
+            self.__reader.set_deadline(limits.body_timeout)
+        return parsed
+
+
+    def begin_write(self):
+        '''Called before writing the response, to switch to the write timeout'''
+        self.__reader.set_socket_timeout(self.devhttpsrv.limits.write_timeout)
+
+
+    def detach(self):
+        '''
+        Keep the connection open after this handler finishes
+
+        For endpoints that pass the connection on to be served elsewhere
+        '''
+        self.server.detach_request(self.request)
+
+
+    def send_response_only(self, code, message=None):
+        self.begin_write()
+        super().send_response_only(code, message)
+
+
     def do_GET(self):
+        self.dispatch('GET')
+
+    def do_HEAD(self):
+        self.dispatch('HEAD')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_PATCH(self):
+        self.dispatch('PATCH')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def do_OPTIONS(self):
+        self.dispatch('OPTIONS')
+
+
+    def dispatch(self, method):
+
+        self.endpoint = None
 
         # Parse URL
         self.url = urlparse(self.path)
@@ -60,11 +147,70 @@ class DevelopmentRequestHandler(BaseHTTPRequestHandler):
 
         # Pass to endpoint to respond
         try:
-            self.devhttpsrv.get_endpoint(path, 'GET').respond(self)
+            self.endpoint = self.devhttpsrv.get_endpoint(path, method, self.url.query)
+            if not self.endpoint.accepts(method):
+                self.send_error(501, "Unsupported method (%r)" % (method))
+                return
+            self.endpoint.respond(self)
+        except socket.timeout:
+            # Client too slow reading or writing, drop it
+            self.devhttpsrv.limits.record_timeout()
+            self.close_connection = True
         except Exception as e:
             InternalError(e).respond(self)
 
 
+    def log_request(self, code='-', size='-'):
+        '''
+        Log an accepted request
+
+        If an AccessLog has been configured on the server, the entry is handed
+        to it instead of being formatted and written to stderr by this thread.
+        That happens once the request has been handled, so the size can be
+        taken from the Content-Length header sent after send_response().
+        '''
+        if self.devhttpsrv.access_log is None:
+            return super().log_request(code, size)
+
+        self.__access_entry = [code, size]
+
+
+    def send_header(self, keyword, value):
+        super().send_header(keyword, value)
+
+        entry = self.__access_entry
+        if entry is not None and entry[1] == '-' and keyword.lower() == 'content-length':
+            try:
+                entry[1] = int(value)
+            except ValueError:
+                pass
+
+
+    def _write_access_entry(self):
+        '''Hand the entry recorded by log_request() to the AccessLog'''
+
+        entry = self.__access_entry
+        if entry is None:
+            return
+        self.__access_entry = None
+
+        access_log = self.devhttpsrv.access_log
+        if access_log is None:
+            return
+        if not access_log.log_static and isinstance(self.endpoint, StaticEndpoint):
+            return
+
+        code, size = entry
+        headers = getattr(self, 'headers', None)
+        access_log.log(
+            client_ip = self.client_address[0],
+            requestline = getattr(self, 'requestline', ''),
+            status = int(code) if code != '-' else 0,
+            size = size,
+            referer = headers.get('Referer') if headers else None,
+            user_agent = headers.get('User-Agent') if headers else None)
+
+
     def __getitem__(self, key):
         '''
         Get request parameters
@@ -73,9 +219,5 @@ class DevelopmentRequestHandler(BaseHTTPRequestHandler):
 
         :param key: name of desired parameter
         '''
-        query = parse_qs(self.url.query)
-        try:
-            return query[key][0] # Assuming 1 entry for every key
-        except IndexError:
-            raise KeyError("No value for " + str(key))
+        return query_parameter(self.url.query, key)
 
@@ -0,0 +1,272 @@
+import json
+import time
+import socket
+import logging
+import selectors
+from collections import deque
+from threading import Thread, Lock
+
+
+class EventSubscriber:
+    '''A connection handed to the EventBroadcaster and its unsent data'''
+
+    __slots__ = ('sock', 'channel', 'buffer', 'writing')
+
+    def __init__(self, sock, channel):
+        self.sock = sock
+        self.channel = channel
+        self.buffer = bytearray()
+        self.writing = False
+
+
+class EventBroadcaster:
+    '''
+    Sends Server-Sent Events to every subscribed connection from a single thread
+
+    Handler threads hand over the connection once the response headers have been
+    sent (see EventStreamEndpoint), so an idle subscriber costs a socket rather
+    than a thread.  Each subscriber has a bounded buffer of data not yet accepted
+    by the socket, and is disconnected if it falls further behind than that.
+    '''
+
+    def __init__(self, max_buffer=256 * 1024, heartbeat_interval=15):
+        '''
+        :param max_buffer:
+            Maximum bytes waiting to be sent to a single subscriber before it is
+            considered too slow and disconnected
+        :param heartbeat_interval:
+            Seconds between comment lines sent to keep idle connections open
+            (and to notice clients that have gone away)
+        '''
+        self.max_buffer = max_buffer
+        self.heartbeat_interval = heartbeat_interval
+
+        # Work handed to the broadcaster thread:
+        #   ('subscribe', sock, channel) or ('publish', channel, message)
+        self.__pending = deque()
+        self.__lock = Lock()
+        self.__thread = None
+        self.__wake_r = None
+        self.__wake_w = None
+        self.__closed = False
+
+        self.__subscribers = 0
+        self.__evicted = 0
+
+
+    @property
+    def subscriber_count(self):
+        return self.__subscribers
+
+    @property
+    def evicted_count(self):
+        '''Number of subscribers disconnected for being too slow'''
+        return self.__evicted
+
+
+    def subscribe(self, sock, channel):
+        '''
+        Hand over a connection that has had the event stream headers sent
+
+        :param sock: The client socket (no longer used by its handler)
+        :param channel: Name of the channel to send events from
+        '''
+        sock.setblocking(False)
+        with self.__lock:
+            if self.__closed:
+                sock.close()
+                return
+            if self.__thread is None:
+                self.__start()
+            self.__pending.append(('subscribe', sock, channel))
+        self.__wake()
+
+
+    def publish(self, channel, data, event=None, id=None):
+        '''
+        Send an event to every subscriber of a channel
+
+        :param channel: Name of the channel
+        :param data: str to send (or anything else, which is sent as JSON)
+        :param event: Optional event type
+        :param id: Optional event id
+        '''
+        if not isinstance(data, str):
+            data = json.dumps(data)
+
+        lines = list()
+        if id is not None:
+            lines.append('id: %s' % (id))
+        if event is not None:
+            lines.append('event: %s' % (event))
+        for line in data.split('\n'):
+            lines.append('data: %s' % (line))
+        message = ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+        with self.__lock:
+            # Nobody has ever subscribed, so there is nobody to send to
+            if self.__thread is None or self.__closed:
+                return
+            self.__pending.append(('publish', channel, message))
+        self.__wake()
+
+
+    def close(self):
+        '''Disconnect all subscribers and stop the broadcaster thread'''
+        with self.__lock:
+            self.__closed = True
+            thread = self.__thread
+        if thread is not None:
+            self.__wake()
+            thread.join()
+
+
+    def __start(self):
+        self.__wake_r, self.__wake_w = socket.socketpair()
+        self.__wake_r.setblocking(False)
+        self.__wake_w.setblocking(False)
+        self.__thread = Thread(target=self.__run, name='devhttp-events', daemon=True)
+        self.__thread.start()
+
+
+    def __wake(self):
+        try:
+            self.__wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass    # Already woken (or closing)
+
+
+    def __run(self):
+        '''Body of the broadcaster thread'''
+
+        self.__selector = selectors.DefaultSelector()
+        self.__selector.register(self.__wake_r, selectors.EVENT_READ, None)
+        self.__channels = dict()    # [channel]: set(EventSubscriber)
+
+        next_heartbeat = time.monotonic() + self.heartbeat_interval
+
+        try:
+            while not self.__closed:
+
+                timeout = max(0, next_heartbeat - time.monotonic())
+                for key, mask in self.__selector.select(timeout):
+                    subscriber = key.data
+                    if subscriber is None:
+                        self.__drain_wake()
+                        continue
+                    if mask & selectors.EVENT_READ:
+                        self.__read(subscriber)
+                    if mask & selectors.EVENT_WRITE and subscriber.sock.fileno() != -1:
+                        self.__flush(subscriber)
+
+                self.__process_pending()
+
+                if time.monotonic() >= next_heartbeat:
+                    for subscribers in list(self.__channels.values()):
+                        for subscriber in list(subscribers):
+                            self.__send(subscriber, b':\n\n')
+                    next_heartbeat = time.monotonic() + self.heartbeat_interval
+
+        except Exception:
+            logging.getLogger(__name__).exception("Event broadcaster failed")
+
+        finally:
+            for subscribers in list(self.__channels.values()):
+                for subscriber in list(subscribers):
+                    self.__remove(subscriber)
+            for item in self.__pending:
+                if item[0] == 'subscribe':
+                    item[1].close()
+            self.__selector.close()
+            self.__wake_r.close()
+            self.__wake_w.close()
+
+
+    def __drain_wake(self):
+        try:
+            while self.__wake_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+
+    def __process_pending(self):
+        while True:
+            try:
+                item = self.__pending.popleft()
+            except IndexError:
+                return
+
+            if item[0] == 'subscribe':
+                sock, channel = item[1], item[2]
+                subscriber = EventSubscriber(sock, channel)
+                self.__selector.register(sock, selectors.EVENT_READ, subscriber)
+                self.__channels.setdefault(channel, set()).add(subscriber)
+                self.__subscribers += 1
+
+            else:
+                channel, message = item[1], item[2]
+                for subscriber in list(self.__channels.get(channel, ())):
+                    self.__send(subscriber, message)
+
+
+    def __send(self, subscriber, message):
+        '''Queue a message for a subscriber and send as much as the socket takes'''
+        if len(subscriber.buffer) + len(message) > self.max_buffer:
+            self.__evicted += 1
+            self.__remove(subscriber)
+            return
+        subscriber.buffer += message
+        self.__flush(subscriber)
+
+
+    def __flush(self, subscriber):
+        try:
+            sent = subscriber.sock.send(subscriber.buffer)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self.__remove(subscriber)
+            return
+        del subscriber.buffer[:sent]
+
+        # Only wait for the socket to be writable while there's something to write
+        writing = len(subscriber.buffer) > 0
+        if writing != subscriber.writing:
+            events = selectors.EVENT_READ
+            if writing:
+                events |= selectors.EVENT_WRITE
+            self.__selector.modify(subscriber.sock, events, subscriber)
+            subscriber.writing = writing
+
+
+    def __read(self, subscriber):
+        '''Clients don't send anything after the request, so this is a disconnect'''
+        try:
+            data = subscriber.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self.__remove(subscriber)
+
+
+    def __remove(self, subscriber):
+        subscribers = self.__channels.get(subscriber.channel)
+        if subscribers is None or subscriber not in subscribers:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self.__channels[subscriber.channel]
+        self.__subscribers -= 1
+
+        try:
+            self.__selector.unregister(subscriber.sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            subscriber.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        subscriber.sock.close()
@@ -0,0 +1,35 @@
+from urllib.parse import urlparse
+from http.client import HTTPMessage
+
+from .utils import query_parameter
+
+
+class FrozenRequest:
+    '''
+    Stand-in for DevelopmentRequestHandler when rendering a dynamic endpoint
+    ahead of time (see DevelopmentHttpServer.freeze())
+
+    Only provides the request details.  There is no client to respond to.
+    '''
+
+    command = 'GET'
+    request_version = 'HTTP/1.0'
+    client_address = None
+
+    def __init__(self, url, query=''):
+        '''
+        :param url: URL path being rendered
+        :param query: Query string being rendered
+        '''
+        self.path = '/' + url + ('?' + query if query else '')
+        self.url = urlparse(self.path)
+        self.headers = HTTPMessage()
+
+
+    def __getitem__(self, key):
+        '''
+        Get request parameters
+
+        :param key: name of desired parameter
+        '''
+        return query_parameter(self.url.query, key)
@@ -1,7 +1,35 @@
+from collections.abc import Mapping
 
 
-
-class ServerAssetsAccess:
+class ServerAssetsAccess(Mapping):
     '''Provides access to the assets and static files to dynamic content generators'''
 
-    
\ No newline at end of file
+    def __init__(self, assets, url_for):
+        '''
+        :param assets: The server's assets container (name: AssetFile)
+        :param url_for: Callable mapping an endpoint URL to the URL to give the browser
+        '''
+        self.__assets = assets
+        self.__url_for = url_for
+
+
+    def __getitem__(self, name):
+        return self.__assets[name]
+
+    def __iter__(self):
+        return iter(self.__assets)
+
+    def __len__(self):
+        return len(self.__assets)
+
+    def __contains__(self, name):
+        return name in self.__assets
+
+
+    def url_for(self, url):
+        '''
+        URL to reference a static file from generated content
+
+        Returns the fingerprinted URL if the file was added with fingerprint=True
+        '''
+        return self.__url_for(url)
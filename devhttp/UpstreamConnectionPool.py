@@ -0,0 +1,99 @@
+import select
+from threading import Lock
+from urllib.parse import urlsplit
+from http.client import HTTPConnection, HTTPSConnection
+
+
+class UpstreamConnectionPool:
+    '''
+    Keep-alive connections to a single upstream server
+
+    Connections are handed out to one request at a time and returned once the
+    response has been read completely.  The most recently used idle connection
+    is handed out first, as it's the least likely to have been closed upstream.
+    '''
+
+    def __init__(self, upstream_url, max_idle=8, timeout=30):
+        '''
+        :param upstream_url:
+            Base URL of the upstream server (http:// or https://, optionally with a path)
+        :param max_idle:
+            Maximum number of idle connections to keep open
+        :param timeout:
+            Seconds to wait when connecting to and reading from the upstream
+        '''
+        parts = urlsplit(upstream_url)
+        if parts.scheme == 'http':
+            self.__connection_class = HTTPConnection
+        elif parts.scheme == 'https':
+            self.__connection_class = HTTPSConnection
+        else:
+            raise ValueError("Unsupported upstream URL: %s" % (upstream_url))
+
+        self.__host = parts.hostname
+        self.__port = parts.port
+        self.__netloc = parts.netloc
+        self.__base_path = parts.path.rstrip('/')
+        self.__max_idle = max_idle
+        self.__timeout = timeout
+
+        self.__idle = list()
+        self.__lock = Lock()
+
+
+    @property
+    def netloc(self):
+        return self.__netloc
+
+    @property
+    def base_path(self):
+        return self.__base_path
+
+
+    def acquire(self):
+        '''Get a connection to send a request on (an idle one if available)'''
+        while True:
+            with self.__lock:
+                if not self.__idle:
+                    break
+                conn = self.__idle.pop()
+            if self.__is_open(conn):
+                return conn
+            conn.close()
+
+        return self.__connection_class(self.__host, self.__port, timeout=self.__timeout)
+
+
+    @staticmethod
+    def __is_open(conn):
+        '''
+        Check an idle connection hasn't been closed by the upstream
+
+        Nothing should arrive on an idle connection, so if it's readable the
+        upstream has closed it (or sent something unexpected) and it can't be used.
+        '''
+        if conn.sock is None:
+            return False
+        try:
+            readable = select.select([conn.sock], [], [], 0)[0]
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+
+    def release(self, conn):
+        '''Return a connection whose response has been completely read'''
+        with self.__lock:
+            if len(self.__idle) < self.__max_idle:
+                self.__idle.append(conn)
+                return
+        conn.close()
+
+
+    def close(self):
+        '''Close all idle connections'''
+        with self.__lock:
+            idle = self.__idle
+            self.__idle = list()
+        for conn in idle:
+            conn.close()
@@ -1,16 +1,19 @@
-
+import socket
+from threading import BoundedSemaphore
 
 from .Endpoint import Endpoint
 from .InternalError import InternalError
+from .ServiceUnavailableEndpoint import ServiceUnavailableEndpoint
 
 class DynamicEndpoint(Endpoint):
 
-    def __init__(self, callable, server, assets, content_type, autolock=True):
+    def __init__(self, callable, server, assets, content_type, autolock=True, max_concurrency=None):
         '''
 
         :param callable: The callable to generate the content for the client
         :param server: The DevelopmentHttpServer object
         :param assets: The assets container
+        :param max_concurrency: Maximum requests to run at once (None for no limit)
         '''
         self.__view_callable = callable
         self.__server = server
@@ -18,9 +21,34 @@ class DynamicEndpoint(Endpoint):
         self.__content_type = content_type
         self.__autolock = autolock
 
+        self.__slots = None
+        if max_concurrency is not None:
+            self.__slots = BoundedSemaphore(max_concurrency)
+
 
     def respond(self, request):
 
+        # Shed the request straight away if this view is already at its limit
+        if self.__slots is None:
+            self._respond(request)
+        elif self.__slots.acquire(blocking=False):
+            try:
+                self._respond(request)
+            finally:
+                self.__slots.release()
+        else:
+            limits = self.__server.limits
+            limits.record_shed()
+            ServiceUnavailableEndpoint(limits.retry_after).respond(request)
+
+
+    def generate(self, request):
+        '''
+        Call the view to generate the content for a request
+
+        :return: The content as bytes
+        '''
+
         # Generators are called inside the server lock to let them access
         # server and assets safely.
         # This does mean only ne dynamic endpoint can be run at a time.
@@ -31,15 +59,10 @@ class DynamicEndpoint(Endpoint):
                 locked = True
 
             # Call callable to generate content
-            try:
-                content = self.__view_callable(
-                    request=request,
-                    server=self.__server,
-                    assets=self.__assets)
-            except Exception as e:
-                InternalError(e, "Failed to call dynamic content generator: %s()" % (
-                    self.__view_callable.__name__)).respond(request)
-                return
+            content = self.__view_callable(
+                request=request,
+                server=self.__server,
+                assets=self.__assets)
 
         finally:
             if self.__autolock and locked:
@@ -49,6 +72,19 @@ class DynamicEndpoint(Endpoint):
         if content.__class__ is str:
             content = content.encode('utf-8')
 
+        return content
+
+
+    def _respond(self, request):
+
+        try:
+            content = self.generate(request)
+        except socket.timeout:
+            raise   # Client too slow sending the body, nothing to respond to
+        except Exception as e:
+            InternalError(e, "Failed to call dynamic content generator: %s()" % (
+                self.__view_callable.__name__)).respond(request)
+            return
 
         # Return content headers
         request.send_response(200)
@@ -61,3 +97,8 @@ class DynamicEndpoint(Endpoint):
         request.end_headers()
 
         request.wfile.write(content)
+
+
+    @property
+    def content_type(self):
+        return self.__content_type
@@ -3,6 +3,17 @@ from abc import ABC, abstractmethod
 class Endpoint(ABC):
     '''Something that can be requested from the server'''
 
+    __slots__ = ()
+
+    def accepts(self, method):
+        '''
+        Can this endpoint respond to requests with this method?
+
+        :param method: GET, POST, etc.
+        '''
+        return method == 'GET'
+
+
     @abstractmethod
     def respond(self, request):
         '''
@@ -0,0 +1,28 @@
+
+from .Endpoint import Endpoint
+
+
+class EventStreamEndpoint(Endpoint):
+    '''Server-Sent Events stream, handed off to an EventBroadcaster'''
+
+    def __init__(self, broadcaster, channel):
+        '''
+        :param broadcaster: The EventBroadcaster that will send the events
+        :param channel: Name of the channel this stream subscribes to
+        '''
+        self.__broadcaster = broadcaster
+        self.__channel = channel
+
+
+    def respond(self, request):
+
+        request.send_response(200)
+        request.send_header('Content-Type', 'text/event-stream')
+        request.send_header('Cache-Control', 'no-cache')
+        request.end_headers()
+        request.wfile.flush()
+
+        # The handler thread is done with the connection, but mustn't close it
+        request.close_connection = True
+        request.detach()
+        self.__broadcaster.subscribe(request.connection, self.__channel)
@@ -11,13 +11,16 @@ class InternalError(Endpoint):
 
 
     def respond(self, request):
-        request.send_response(500)
-        request.end_headers()
-        request.wfile.write("""\
+        content = """\
             <h1>{title}</h1>
             <div>{extra}</div>
             <div>{msg}</div>
             """.format(
                 title = self.__e.__class__.__name__,
                 extra = self.__extra or '',
-                msg = str(self.__e)).encode('utf-8'))
+                msg = str(self.__e)).encode('utf-8')
+
+        request.send_response(500)
+        request.send_header('Content-Length', str(len(content)))
+        request.end_headers()
+        request.wfile.write(content)
@@ -6,6 +6,8 @@ class NotFoundEndpoint(Endpoint):
     '''404'''
 
     def respond(self, request):
+        content = "<h1>404 Not Found</h1>".encode('utf-8')
         request.send_response(404)
+        request.send_header('Content-Length', str(len(content)))
         request.end_headers()
-        request.wfile.write("<h1>404 Not Found</h1>".encode('utf-8'))
+        request.wfile.write(content)
@@ -0,0 +1,203 @@
+import socket
+import logging
+from http.client import HTTPException
+
+from .Endpoint import Endpoint
+
+
+# Headers that only apply to a single connection and must not be forwarded
+HOP_BY_HOP_HEADERS = frozenset([
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'proxy-connection', 'te', 'trailer', 'transfer-encoding', 'upgrade',
+])
+
+# Methods that can be safely sent again if the upstream connection fails
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE'])
+
+
+class ClientTimeout(Exception):
+    '''The client timed out sending the request body (wraps the socket.timeout)'''
+
+    def __init__(self, timeout):
+        super().__init__(str(timeout))
+        self.timeout = timeout
+
+
+class RequestBodyReader:
+    '''
+    File-like reader for exactly Content-Length bytes of a request body
+
+    Timeouts reading from the client are raised as ClientTimeout, so they
+    aren't mistaken for the upstream timing out while the body is sent on.
+    '''
+
+    def __init__(self, rfile, length):
+        self.__rfile = rfile
+        self.__remaining = length
+
+    def read(self, size=-1):
+        if self.__remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.__remaining:
+            size = self.__remaining
+        try:
+            data = self.__rfile.read(size)
+        except socket.timeout as e:
+            raise ClientTimeout(e)
+        self.__remaining -= len(data)
+        return data
+
+
+class ProxyEndpoint(Endpoint):
+    '''Forward requests under a URL prefix to an upstream server'''
+
+    BLOCK_SIZE = 64 * 1024
+
+    def __init__(self, prefix, pool, retries=1):
+        '''
+        :param prefix: URL prefix (normalized) this endpoint was added under
+        :param pool: UpstreamConnectionPool for the upstream server
+        :param retries: Times to retry idempotent requests that fail to get a response
+        '''
+        self.__prefix = prefix
+        self.__pool = pool
+        self.__retries = retries
+
+
+    def accepts(self, method):
+        return True
+
+
+    def respond(self, request):
+
+        method = request.command
+
+        # Path on the upstream server
+        path = request.url.path.lstrip('/')[len(self.__prefix):].lstrip('/')
+        target = self.__pool.base_path + '/' + path
+        if request.url.query:
+            target += '?' + request.url.query
+
+        # Request body is streamed through, so it needs a known length
+        body = None
+        if 'chunked' in request.headers.get('Transfer-Encoding', '').lower():
+            request.send_error(411)
+            return
+        try:
+            length = int(request.headers.get('Content-Length', 0))
+        except ValueError:
+            request.send_error(400, "Bad Content-Length")
+            return
+        if length > 0:
+            body = RequestBodyReader(request.rfile, length)
+
+        headers = self._upstream_headers(request)
+
+        # A request can only be sent again if the body hasn't been consumed
+        attempts = 1
+        if body is None and method in IDEMPOTENT_METHODS:
+            attempts += self.__retries
+
+        for attempt in range(attempts):
+            conn = self.__pool.acquire()
+            try:
+                conn.request(method, target, body=body, headers=headers)
+                response = conn.getresponse()
+                break
+            except ClientTimeout as e:
+                # Let dispatch() drop the client as it would for any other timeout
+                conn.close()
+                raise e.timeout
+            except socket.timeout:
+                conn.close()
+                if attempt == attempts - 1:
+                    request.send_error(504, "Upstream timed out")
+                    return
+            except (OSError, HTTPException) as e:
+                conn.close()
+                if attempt == attempts - 1:
+                    logging.getLogger(__name__).warning(
+                        "Proxy request to %s%s failed: %s" % (self.__pool.netloc, target, e))
+                    request.send_error(502, "Upstream request failed")
+                    return
+
+        try:
+            complete = self._relay_response(request, response)
+        except Exception:
+            conn.close()
+            raise
+
+        # Upstream stopped sending part way through the body.  The client has
+        # already had the headers, so all that can be done is close on it.
+        if not complete:
+            logging.getLogger(__name__).warning(
+                "Proxy response from %s%s timed out" % (self.__pool.netloc, target))
+            conn.close()
+            request.close_connection = True
+            return
+
+        # Connection can be used again once the response has been read in full
+        if response.will_close:
+            conn.close()
+        else:
+            response.close()
+            self.__pool.release(conn)
+
+
+    def _upstream_headers(self, request):
+        '''Request headers to send upstream'''
+
+        skip = set(HOP_BY_HOP_HEADERS)
+        skip.update([h.strip().lower() for h in request.headers.get('Connection', '').split(',')])
+        skip.add('host')
+
+        headers = dict()
+        for name, value in request.headers.items():
+            if name.lower() not in skip:
+                headers[name] = value
+
+        headers['Host'] = self.__pool.netloc
+
+        forwarded_for = request.headers.get('X-Forwarded-For')
+        client_ip = request.client_address[0]
+        headers['X-Forwarded-For'] = client_ip if forwarded_for is None else forwarded_for + ', ' + client_ip
+        headers['X-Forwarded-Host'] = request.headers.get('Host', '')
+        headers['X-Forwarded-Proto'] = 'http'
+
+        return headers
+
+
+    def _relay_response(self, request, response):
+        '''
+        Stream the upstream response back to the client
+
+        :return: False if the upstream timed out while sending the body
+        '''
+
+        # Pass on the upstream's Server and Date rather than adding our own
+        request.log_request(response.status)
+        request.send_response_only(response.status, response.reason)
+        if response.getheader('Date') is None:
+            request.send_header('Date', request.date_time_string())
+
+        skip = set(HOP_BY_HOP_HEADERS)
+        skip.update([h.strip().lower() for h in (response.getheader('Connection') or '').split(',')])
+
+        for name, value in response.getheaders():
+            if name.lower() not in skip:
+                request.send_header(name, value)
+
+        # Without a length the end of the body is marked by closing the connection
+        if response.getheader('Content-Length') is None:
+            request.close_connection = True
+
+        request.end_headers()
+
+        while True:
+            try:
+                data = response.read1(self.BLOCK_SIZE)
+            except socket.timeout:
+                return False
+            if not data:
+                return True
+            request.wfile.write(data)
@@ -0,0 +1,18 @@
+
+from .Endpoint import Endpoint
+
+
+class ServiceUnavailableEndpoint(Endpoint):
+    '''503'''
+
+    def __init__(self, retry_after=1):
+        self.__retry_after = retry_after
+
+
+    def respond(self, request):
+        content = "<h1>503 Service Unavailable</h1>".encode('utf-8')
+        request.send_response(503)
+        request.send_header('Retry-After', str(self.__retry_after))
+        request.send_header('Content-Length', str(len(content)))
+        request.end_headers()
+        request.wfile.write(content)
@@ -1,15 +1,57 @@
 
 from .Endpoint import Endpoint
+from ..utils import date_header, send_buffers
 
 
 class StaticEndpoint(Endpoint):
 
-    def __init__(self, asset):
+    __slots__ = ('__file', '__cache_control', '__headers')
+
+    # Write pre-built headers and content with a single call instead of going
+    # through send_response(), send_header() and end_headers()
+    FAST_PATH = True
+
+    def __init__(self, asset, cache_control=None):
+        '''
+        :param asset: The AssetFile to serve
+        :param cache_control: Value for the Cache-Control header (None to omit)
+        '''
         self.__file = asset
+        self.__cache_control = cache_control
+
+        # Headers that are the same for every response, ending the header block
+        headers = list()
+        if self.__file.content_type is not None:
+            headers.append('Content-Type: %s\r\n' % (self.__file.content_type))
+        if self.__file.size is not None:
+            headers.append('Content-Length: %d\r\n' % (self.__file.size))
+        if self.__cache_control is not None:
+            headers.append('Cache-Control: %s\r\n' % (self.__cache_control))
+        headers.append('\r\n')
+        self.__headers = ''.join(headers).encode('latin-1', 'strict')
 
 
     def respond(self, request):
 
+        if not self.FAST_PATH or request.request_version == 'HTTP/0.9':
+            self.respond_buffered(request)
+            return
+
+        content = self.__file.content
+        request.begin_write()
+
+        # Status line and the headers that send_response() would add
+        status = ('%s 200 OK\r\nServer: %s\r\n' % (
+            request.protocol_version, request.version_string())).encode('latin-1', 'strict')
+
+        send_buffers(request.connection, [status, date_header(), self.__headers, content])
+
+        request.log_request(200, len(content))
+
+
+    def respond_buffered(self, request):
+        '''Respond using the BaseHTTPRequestHandler header methods'''
+
         # Return static content
         request.send_response(200)
 
@@ -19,6 +61,9 @@ class StaticEndpoint(Endpoint):
         if self.__file.size is not None:
             request.send_header('Content-Length', str(self.__file.size))
 
+        if self.__cache_control is not None:
+            request.send_header('Cache-Control', self.__cache_control)
+
         request.end_headers()
 
         request.wfile.write(self.__file.content)
@@ -28,4 +73,7 @@ class StaticEndpoint(Endpoint):
     def asset_file(self):
         return self.__file
 
+    @property
+    def cache_control(self):
+        return self.__cache_control
 
@@ -2,4 +2,7 @@
 from .StaticEndpoint import StaticEndpoint
 from .DynamicEndpoint import DynamicEndpoint
 from .NotFoundEndpoint import NotFoundEndpoint
-from .InternalError import InternalError
\ No newline at end of file
+from .InternalError import InternalError
+from .ServiceUnavailableEndpoint import ServiceUnavailableEndpoint
+from .ProxyEndpoint import ProxyEndpoint
+from .EventStreamEndpoint import EventStreamEndpoint
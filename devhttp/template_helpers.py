@@ -1,5 +1,6 @@
 import logging
 
+import jinja2
 from jinja2 import Template as JinjaTemplate
 from jinja2 import Environment, select_autoescape
 from jinja2 import DictLoader, TemplateNotFound
@@ -12,15 +13,70 @@ class AssetContentMapping:
         return self.assets[name].content.decode('utf-8')
     def __contains__(self, name):
         return name in self.assets
+    def get(self, name, default=None):
+        if name in self.assets:
+            return self[name]
+        return default
 
 
+class AssetTemplateLoader(DictLoader):
+    '''
+    Loads templates from assets
 
-def render_jinja(assets, tpl_name, **tpl_parms):
+    Assets loaded back from save_assets_module(precompile_templates=True) carry
+    the compiled template code, which is used instead of parsing the source.
+    '''
+
+    def __init__(self, assets):
+        super().__init__(AssetContentMapping(assets))
+        self.__assets = assets
+
+    def load(self, environment, name, globals=None):
+        code = None
+        if name in self.__assets:
+            code = getattr(self.__assets[name], 'template_code', None)
+        if code is None:
+            return super().load(environment, name, globals)
+
+        return environment.template_class.from_code(
+            environment, code, environment.make_globals(globals), lambda: True)
 
-    env = Environment(
-        loader = DictLoader(AssetContentMapping(assets)),
+
+def create_jinja_environment(loader):
+    '''
+    Environment used to render (and precompile) templates
+
+    Settings like autoescape are baked into compiled templates, so
+    precompiling must use the same environment as render_jinja()
+    '''
+    return Environment(
+        loader = loader,
         autoescape=select_autoescape(['html', 'xml'])
     )
+
+
+def compile_template(name, source):
+    '''
+    Compile template source to Python module source
+
+    :return: Python source for the template, or None if source isn't a valid template
+    '''
+    env = create_jinja_environment(loader=None)
+    try:
+        return env.compile(source, name, raw=True)
+    except jinja2.TemplateSyntaxError as e:
+        logging.getLogger(__name__).debug("Not precompiling %s: %s" % (name, str(e)))
+        return None
+
+
+def render_jinja(assets, tpl_name, **tpl_parms):
+
+    env = create_jinja_environment(AssetTemplateLoader(assets))
+
+    # Let templates reference statics by their (possibly fingerprinted) URL
+    url_for = getattr(assets, 'url_for', None)
+    if url_for is not None:
+        env.globals['url_for'] = url_for
+
     tpl = env.get_template(tpl_name)
     return tpl.render(**tpl_parms)
-
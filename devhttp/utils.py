@@ -1,5 +1,9 @@
 import os
+import time
+import posixpath
 from threading import RLock
+from email.utils import formatdate
+from urllib.parse import parse_qs, parse_qsl, urlencode
 
 from zipfile import ZipFile, ZIP_STORED
 
@@ -13,10 +17,79 @@ def find(root):
                 yield os.path.join(filename, sub_path)
 
 
+def scan(root, prefix=''):
+    '''
+    Like find(), but yields (path, size) using a single stat per file
+
+    Paths are relative to root and always use '/' as the separator
+    '''
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_file():
+                yield prefix + entry.name, entry.stat().st_size
+            elif entry.is_dir():
+                yield from scan(entry.path, prefix + entry.name + '/')
+
+
 def normalize_url(url):
     return url.replace("\\", '/').strip('/')
 
 
+def query_parameter(query, key):
+    '''
+    First value of a parameter in a query string
+
+    :raises KeyError: if the parameter isn't given
+    '''
+    values = parse_qs(query).get(key)
+    if not values:
+        raise KeyError("No value for " + str(key))
+    return values[0] # Assuming 1 entry for every key
+
+
+def normalize_query(query):
+    '''Put a query string (or dict) in a canonical form, to compare request variants'''
+    if isinstance(query, dict):
+        pairs = list(query.items())
+    else:
+        pairs = parse_qsl(query, keep_blank_values=True)
+    return urlencode(sorted(pairs))
+
+
+_date_header = (None, None)
+
+def date_header():
+    '''
+    The encoded 'Date: ...' header line for the current second
+
+    Formatting the date is surprisingly expensive, so it's only done once a second
+    '''
+    global _date_header
+    now = int(time.time())
+    second, line = _date_header
+    if second != now:
+        line = ('Date: %s\r\n' % (formatdate(now, usegmt=True))).encode('latin-1')
+        _date_header = (now, line)
+    return line
+
+
+def send_buffers(sock, buffers):
+    '''
+    Write a list of bytes buffers to a socket
+
+    Uses a single sendmsg() (writev) call where the platform has it, rather than
+    one send per buffer or joining them into a new buffer first.
+    '''
+    if not hasattr(sock, 'sendmsg'):
+        sock.sendall(b''.join(buffers))
+        return
+
+    total = sum([len(b) for b in buffers])
+    sent = sock.sendmsg(buffers)
+    if sent < total:
+        sock.sendall(b''.join(buffers)[sent:])
+
+
 class SharedZipFileReader(ZipFile):
 
     def __init__(self, file, compression=ZIP_STORED, allowZip64=True):
@@ -37,8 +110,11 @@ class SharedZipFileReader(ZipFile):
             return super().infolist()
 
 
+def fingerprint_url(url, digest):
+    '''
+    Insert a content digest into the filename portion of a URL
 
-
-
-
-
+        fingerprint_url('js/app.js', '3f9a1c') -> 'js/app.3f9a1c.js'
+    '''
+    stem, ext = posixpath.splitext(url)
+    return "%s.%s%s" % (stem, digest, ext)